@@ -46,18 +46,18 @@ class DiscretizedMixLogisticLoss(torch.nn.Module):
 
         # activate input
         mix_logits = F.softmax(mix_logits, dim=1)
-        means = F.tanh(means)
+        means = torch.tanh(means)
 
         # max prob of logistic distribution w/ log_var=-7 is 0.97324        
-        log_var = -7 * F.sigmoid(log_var)
+        log_var = -7 * torch.sigmoid(log_var)
         
         centered_x = y - means
         inv_stdv = torch.exp(-log_var)
         plus_in = inv_stdv * (centered_x + 1./255.)
         min_in = inv_stdv * (centered_x - 1./255.)
         
-        cdf_plus = F.sigmoid(plus_in)
-        cdf_min = F.sigmoid(min_in)
+        cdf_plus = torch.sigmoid(plus_in)
+        cdf_min = torch.sigmoid(min_in)
         cdf_delta = cdf_plus - cdf_min
         log_cdf_plus = plus_in - F.softplus(plus_in) # equiv to log(sig(plus_in))
         log_one_minus_cdf_min = -F.softplus(min_in)  # equiv to log(1 - sig(min_in))
@@ -120,8 +120,8 @@ class SampleDiscretizedMixLogistics(torch.nn.Module):
         log_var    = l[:, 2*n_gaus:        , :]
 
         # activate params
-        means = F.tanh(means)
-        log_var = -7 * F.sigmoid(log_var) # max prob of logistic distribution w/ log_var=-7 is 0.97324 ()
+        means = torch.tanh(means)
+        log_var = -7 * torch.sigmoid(log_var) # max prob of logistic distribution w/ log_var=-7 is 0.97324 ()
         
         # pick which mixture component to use from mix_logits
         # uses "Gumbel-max trick" to sample from raw logits:
@@ -159,3 +159,28 @@ class SampleDiscretizedMixLogistics(torch.nn.Module):
             x = torch.round(x).long()
         
         return x
+
+
+def sample_mix_logistics_from_noise(l, gumbel_noise, u, out=None):
+    """
+    Samples one step of a discretized logistic mixture from pre-drawn noise
+    l is (B x 3*n_mix) unscaled params, gumbel_noise is (B x n_mix),
+    u is (B) uniform in (0, 1). Writes quantized [0, 255] samples into out if given.
+    No host sync, so it can run every inference step without stalling the GPU
+    """
+    n_gaus = l.size(1) // 3
+    l = l.float()
+
+    # Gumbel-max pick of the mixture component
+    sel = torch.argmax(l[:, :n_gaus] + gumbel_noise, dim=1, keepdim=True)
+    means = torch.tanh(l[:, n_gaus:2*n_gaus].gather(1, sel)).squeeze(1)
+    log_var = -7 * torch.sigmoid(l[:, 2*n_gaus:].gather(1, sel)).squeeze(1)
+
+    # inverse logistic cdf of u is a sample from the logistic distribution
+    x = means + torch.exp(log_var) * (torch.log(u) - torch.log(1. - u))
+    x = (torch.clamp(x, -1, 1) + 1) * 127.5
+    x = torch.round(x)
+
+    if out is None:
+        return x.long()
+    return out.copy_(x)
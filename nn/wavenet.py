@@ -38,13 +38,64 @@ import torch
 import math
 import random
 import time
-from collections import deque
+import contextlib
 import debug
 
 import numpy as np
 import torch.nn.functional as F
+from torch import Tensor
+from typing import Final, List, Optional
 import utils
-from nn.discretized_mix_logistics import SampleDiscretizedMixLogistics
+from nn.discretized_mix_logistics import sample_mix_logistics_from_noise
+
+
+@torch.jit.script
+def fused_gated_act(in_act, n_channels: int):
+    """
+    Gated activation tanh(in_act[:, :R]) * sigmoid(in_act[:, R:])
+    Scripted so the JIT fuser emits a single elementwise kernel
+    """
+    return torch.tanh(in_act[:, :n_channels]) * torch.sigmoid(in_act[:, n_channels:])
+
+
+@torch.jit.script
+def fast_gated_act(in_act, n_channels: int):
+    """
+    Piecewise linear gated activation hardtanh * hardsigmoid
+    Cheaper than tanh * sigmoid on CPU, used when Wavenet built with fast_act
+    """
+    return F.hardtanh(in_act[:, :n_channels]) * F.hardsigmoid(in_act[:, n_channels:])
+
+
+@torch.jit.script
+def res_update(acts, forward_input, gain):
+    """
+    Residual connection and block gain (acts + forward_input) * gain
+    Scripted so the add and multiply run as one fused kernel
+    """
+    return (acts + forward_input) * gain
+
+
+def int8_linear(x: Tensor,
+                packed_weight: torch.classes.quantized.LinearPackedParamsBase) -> Tensor:
+    """
+    x (B x C_in) float times an int8 weight packed by Conv.export_int8
+    Activations are quantized on the fly, output is float (B x C_out)
+    reduce_range: 7 bit activations, so fbgemm's u8 x s8 pair sums can't saturate
+    (as torch.ao.nn.quantized.dynamic.Linear does)
+    """
+    assert(not x.is_cuda), "int8 weights are CPU only, clear_int8() before moving to CUDA"
+    return torch.ops.quantized.linear_dynamic(x.contiguous(), packed_weight, True)
+
+
+@torch.jit.interface
+class InferStep(torch.nn.Module):
+    """
+    Conv.infer_step as a TorchScript interface, so scripted code can index
+    a ModuleList of Convs with a loop variable
+    """
+    def infer_step(self, x: Tensor) -> Tensor:
+        pass
 
 
 class Conv(torch.nn.Module):
@@ -53,6 +104,11 @@ class Conv(torch.nn.Module):
     Implements "Fast Wavenet Generation Algorithm" for quick inference: 
                                        https://arxiv.org/abs/1611.09482
     """
+    # types of the inference caches, needed to script infer_step
+    W0: Optional[Tensor]
+    W1: Optional[Tensor]
+    B: Optional[Tensor]
+
     def __init__(self, in_channels, out_channels, kernel_size=1, stride=1,
                  dilation=1, bias=True, w_init_gain='linear', is_causal=False,
                  use_act=False):
@@ -62,31 +118,46 @@ class Conv(torch.nn.Module):
         self.in_channels = in_channels
         self.dilation = dilation
 
-        # Input memory activates if infer_sample() called
-        self.input_memory = None
+        # Input memory activates if infer_step() called
+        # ring holds the last dilation input samples, wp indexes the oldest one
+        # Non-persistent buffers: follow .to()/.half(), stay out of checkpoints,
+        # and keep infer_step free of Python containers (scriptable, capturable)
+        # Empty until the first infer_step
+        self.register_buffer("ring", torch.zeros(0), persistent=False)
+        self.register_buffer("wp", torch.zeros(0, dtype=torch.long), persistent=False)
+
+        # Per-tap weights (C_in x C_out) and bias for infer_step, cached from
+        # self.conv by cache_weights (W1 only used when kernel_size=2)
+        self.W0 = None
+        self.W1 = None
+        self.B = None
+
+        # Packed int8 weights, one per kernel tap, set by export_int8()
+        self.packed_int8 = None
         
         self.conv = torch.nn.Conv1d(in_channels, out_channels,
                                     kernel_size=kernel_size, stride=stride,
                                     dilation=dilation, bias=bias)
 
         # Softsign activation recommended by DeepVoice3, a tanh alternative
+        # (parameter free, always built so the module scripts either way)
         self.use_act = use_act
-        if self.use_act:
-            self.act = torch.nn.Softsign()
+        self.act = torch.nn.Softsign()
         
         torch.nn.init.xavier_uniform_(
             self.conv.weight, gain=torch.nn.init.calculate_gain(w_init_gain))
 
-    def forward(self, signal):
+    def forward(self, signal: Tensor) -> Tensor:
         if self.is_causal:
             padding = (int((self.kernel_size - 1) * (self.dilation)), 0)
-            signal = torch.nn.functional.pad(signal, padding).cuda()
+            signal = F.pad(signal, padding)
         signal = self.conv(signal)
         if self.use_act:
             signal = self.act(signal)
         return signal
     
-    def infer_step(self, x):
+    @torch.jit.export
+    def infer_step(self, x: Tensor) -> Tensor:
         """
         Added by Gary Plunkett, Feb 2019
         - Works for any dilation size
@@ -102,42 +173,137 @@ class Conv(torch.nn.Module):
 
         # use last time sample if handed a sequence
         if (x.size(-1) > 1):
-            x = x[:, :, -1]
+            x = x[:, :, -1:]
+
+        # locals, so TorchScript can refine the Optional caches
+        W0 = self.W0
+        W1 = self.W1
+        B = self.B
 
         if self.kernel_size == 1:
-            return self.conv(x)
+            if self.packed_int8 is not None:
+                out = int8_linear(x[:, :, 0], self.packed_int8[0])
+            elif W0 is None:
+                out = self.conv(x)[:, :, 0]
+            elif B is None:
+                out = torch.mm(x[:, :, 0], W0)
+            else:
+                out = torch.addmm(B, x[:, :, 0], W0)
+            out = out.unsqueeze(-1)
 
-        elif self.is_causal:
-            if self.input_memory is None:
+        else:
+            assert(self.is_causal)
+            if self.ring.numel() == 0:
                 self.init_input_memory(x)
-                
-            self.input_memory.appendleft(x.clone())
-            x0 = self.input_memory.pop()
-            x0_x1 = torch.cat((x0, x), 2)
-            W = self.conv.weight.data
+                W0 = self.W0
+                W1 = self.W1
+                B = self.B
+
+            # read the sample from dilation steps ago, overwrite it with the
+            # current one, then advance wp to the next oldest slot
+            x0 = self.ring.index_select(2, self.wp).squeeze(2)
+            self.ring.index_copy_(2, self.wp, x)
+            self.wp.add_(1).remainder_(self.dilation)
+
+            # length-2 conv == W[:, :, 0] @ x0 + W[:, :, 1] @ x1 + B
+            if self.packed_int8 is not None:
+                out = int8_linear(x0, self.packed_int8[0])
+                out = out + int8_linear(x[:, :, 0], self.packed_int8[1])
+            else:
+                assert((W0 is not None) and (W1 is not None))
+                if B is None:
+                    out = torch.mm(x0, W0)
+                else:
+                    out = torch.addmm(B, x0, W0)
+                out.addmm_(x[:, :, 0], W1)
+            out = out.unsqueeze(-1)
 
-            if self.conv.bias is None:
-                return F.conv1d(x0_x1, W)
+        if self.use_act:
+            out = self.act(out)
+        return out
+
+    def init_input_memory(self, x: Tensor):
+        # Zero-filled ring buffer of past inputs, one column per time step
+        self.ring = x.new_zeros(x.size(0), self.in_channels, self.dilation)
+        self.wp = torch.zeros(1, dtype=torch.long, device=x.device)
+        # refresh tap weights, unless already set by Wavenet.stack_dilate_weights
+        if self.W0 is None:
+            self.cache_weights()
+
+    def cache_weights(self, dtype: Optional[torch.dtype] = None):
+        """
+        Caches transposed weight taps and bias for infer_step
+        dtype casts the caches (e.g. fp16 inference), default the parameter dtype
+        Runs under inference() (no_grad), so the caches hold no graph
+        """
+        if dtype is None:
+            dtype = self.conv.weight.dtype
+        W = self.conv.weight.to(dtype)
+        self.W0 = W[:, :, 0].t().contiguous()
+        if self.kernel_size == 2:
+            self.W1 = W[:, :, 1].t().contiguous()
+        bias = self.conv.bias
+        if bias is not None:
+            self.B = bias.to(dtype)
+
+    def clear_input_memory(self):
+        # Drop cached inputs, next infer_step starts from silence
+        self.ring = self.ring.new_zeros(0)
+        self.wp = self.wp.new_zeros(0)
+        self.W0 = None
+        self.W1 = None
+        self.B = None
+
+    def export_int8(self):
+        """
+        Quantizes weights to int8 with one scale per output channel
+        infer_step then runs an fbgemm int8 GEMM per kernel tap (CPU only)
+        """
+        assert(not self.conv.weight.is_cuda)
+        W = self.conv.weight.float()
+        scales = W.abs().amax(dim=(1, 2)).clamp(min=1e-8) / 127.
+        zero_points = torch.zeros(W.size(0), dtype=torch.long)
+
+        self.packed_int8 = []
+        for k in range(self.kernel_size):
+            W_int8 = torch.quantize_per_channel(W[:, :, k].contiguous(), scales.double(),
+                                                zero_points, 0, torch.qint8)
+            # bias added once, with the tap applied to the newest sample
+            if (self.conv.bias is not None) and (k == self.kernel_size - 1):
+                B = self.conv.bias.float()
+            else:
+                B = None
+            self.packed_int8.append(torch.ops.quantized.linear_prepack(W_int8, B))
+
+    def clear_int8(self):
+        # Drop the int8 snapshot, infer_step goes back to the float weights
+        self.packed_int8 = None
+
+    @torch.jit.export
+    def reset_input_memory(self):
+        # Zero cached inputs in place, keeps buffer addresses for CUDA graphs
+        if self.ring.numel() > 0:
+            self.ring.zero_()
+            self.wp.zero_()
+
+    def __setstate__(self, state):
+        # Modules pickled before the ring buffer and weight caches existed
+        super(Conv, self).__setstate__(state)
+        self.__dict__.pop("input_memory", None)
+        if self._buffers.get("ring") is None:
+            self.register_buffer("ring", torch.zeros(0), persistent=False)
+            self.register_buffer("wp", torch.zeros(0, dtype=torch.long), persistent=False)
+        for name in ("W0", "W1", "B", "packed_int8"):
+            if not hasattr(self, name):
+                setattr(self, name, None)
+        if "act" not in self._modules:
+            self.act = torch.nn.Softsign()
 
-            B = self.conv.bias.data
-            
-            return F.conv1d(x0_x1, W, B)
-
-    def init_input_memory(self, x):
-        # Initialize memory queue and fill w/ zero vectors
-        # Each zero is a new view on same underlying storage (mem efficiency)
-        self.input_memory = deque()
-        device = x.device
-        zero_sample = torch.zeros(size=[x.size(0), self.in_channels, 1]).to(device)
-        for i in range(self.dilation):
-            self.input_memory.append(zero_sample.view(zero_sample.size()))
-        
 
 class UpsampleByRepetition(torch.nn.Module):
     """
     Upsample by repitition expects a (B x C x T) tensor
-    Returns a (B x C x (T*upscale)) tensor
-    Doesn't duplicate underlying storage
+    Returns a contiguous (B x C x (T*upscale)) tensor
     """
     
     def __init__(self, upscale):
@@ -145,9 +311,7 @@ class UpsampleByRepetition(torch.nn.Module):
         self.upscale = upscale
     
     def forward(self, X):
-        upsamp = X.unsqueeze(2)
-        upsamp = upsamp.expand(X.size(0), X.size(1), self.upscale, X.size(2))
-        upsamp = upsamp.transpose(2, 3).flatten(2, 3)
+        upsamp = X.repeat_interleave(self.upscale, dim=2)
         assert(upsamp.size()[:-1] == X.size()[:-1])
         assert(upsamp.size(2) == self.upscale * X.size(2))
         return upsamp
@@ -174,15 +338,35 @@ class QuantizedInputLayer(torch.nn.Module):
 
     
 class Wavenet(torch.nn.Module):
+    # constant flags, TorchScript prunes the branches for absent layers
+    use_conditioning: Final[bool]
+    same_cond_each_resblock: Final[bool]
+    use_skip_out: Final[bool]
+    use_res_out_conv: Final[bool]
+    
     def __init__(self, onehot_input, n_in_channels, use_in_bias, use_in_act,
                  n_layers, max_dilation, n_residual_channels, use_dilate_bias, use_res_out_conv, use_res_out_bias, res_block_gain,
                  use_skip_out, n_skip_channels, use_skip_bias, n_skip_to_out_channels, n_out_channels,
                  use_conditioning, same_cond_each_resblock, n_cond_channels, use_cond_conv, use_cond_bias, use_cond_act,
                  resblock_drop_prob, out_drop_prob,
-                 upsamp_scale, upsample_by_copy, upsamp_conv_window, name):
+                 upsamp_scale, upsample_by_copy, upsamp_conv_window, name, fast_act=False,
+                 compile_forward=False):
         super(Wavenet, self).__init__()
 
         self.name = name
+
+        # hardtanh/hardsigmoid gate, must match between training and inference
+        self.fast_act = fast_act
+
+        # torch.compile the training forward (torch >= 2.0), compiled lazily on
+        # first call, one variant per value of training so dropout stays static
+        if compile_forward:
+            assert hasattr(torch, "compile"), "compile_forward needs torch >= 2.0"
+        self.compile_forward = compile_forward
+        self._compiled_forward = {}
+        # TorchScript copies for inference(use_script=True), built on first use
+        # (in a dict, so they aren't registered as submodules)
+        self._scripted = {}
         
         self.n_layers = n_layers
         self.max_dilation = max_dilation
@@ -203,7 +387,11 @@ class Wavenet(torch.nn.Module):
         self.use_res_out_bias = use_res_out_bias
         
         self.use_res_out_conv = use_res_out_conv
-        self.res_block_gain = res_block_gain
+        # buffer so it follows .half()/.to() and autocast sees a tensor
+        self.register_buffer("res_block_gain", torch.tensor(float(res_block_gain)),
+                             persistent=False)
+        # dtype infer_step runs in, set by prepare_for_inference
+        self.infer_dtype = torch.float32
         
         if upsample_by_copy:
             self.upsample = UpsampleByRepetition(self.upscale)      
@@ -268,11 +456,23 @@ class Wavenet(torch.nn.Module):
         self.resblock_dropout = torch.nn.Dropout(p=resblock_drop_prob)
             
             
+    @torch.jit.ignore
     def forward(self, forward_input, training=True):
 
         features = forward_input[0]
         forward_input = forward_input[1]
 
+        if not self.compile_forward:
+            return self._forward_impl(features, forward_input, training)
+
+        if training not in self._compiled_forward:
+            self._compiled_forward[training] = torch.compile(self._forward_impl,
+                                                             dynamic=False, fullgraph=False)
+        return self._compiled_forward[training](features, forward_input, training)
+
+
+    def _forward_impl(self, features, forward_input, training):
+
         if self.use_conditioning:
             if (self.upscale != 1):
                 cond_input = self.upsample(features)
@@ -285,11 +485,13 @@ class Wavenet(torch.nn.Module):
                 cond_input = self.cond_layers(cond_input)
                 # debug.plot_tensor(cond_input, "test/"  + self.name + "/cond_input")
             if not self.same_cond_each_resblock:
-                cond_input = cond_input.view(cond_input.size(0), self.n_layers, -1, cond_input.size(2))
+                # sliced once into per layer B x 2R x T views
+                cond_list = cond_input.view(cond_input.size(0), self.n_layers, -1,
+                                            cond_input.size(2)).unbind(1)
 
         # debug.plot_tensor(forward_input, "test/" + self.name + "/raw_input")
         
-        forward_input = self.in_layer(forward_input).cuda()
+        forward_input = self.in_layer(forward_input)
 
         # debug.plot_tensor(forward_input, "test/" + self.name + "/input_transform")
 
@@ -304,12 +506,13 @@ class Wavenet(torch.nn.Module):
                 if self.same_cond_each_resblock:
                     cond_act = cond_input
                 else:
-                    cond_act = cond_input[:, i, :, :]
+                    cond_act = cond_list[i]
                 in_act = in_act + cond_act                    
             
-            t_act = F.tanh(in_act[:, :self.n_residual_channels, :])
-            s_act = F.sigmoid(in_act[:, self.n_residual_channels:, :])
-            acts = t_act * s_act
+            if self.fast_act:
+                acts = fast_gated_act(in_act, self.n_residual_channels)
+            else:
+                acts = fused_gated_act(in_act, self.n_residual_channels)
 
             # debug.plot_tensor(acts, "test/" + self.name + "/act" + str(i))
 
@@ -322,8 +525,7 @@ class Wavenet(torch.nn.Module):
             if (self.use_res_out_conv) and (i < len(self.res_layers)):
                 acts = self.res_layers[i](acts)
 
-            forward_input = acts + forward_input
-            forward_input = forward_input * self.res_block_gain #from DeepVoice3, reduce input variance early in training
+            forward_input = res_update(acts, forward_input, self.res_block_gain) #from DeepVoice3, reduce input variance early in training
 
 
         # Feed forward output if using skip out
@@ -345,77 +547,119 @@ class Wavenet(torch.nn.Module):
             output = forward_input
             
         # Remove last probabilities because they've seen all the data
-        last = output[:, :, -1]
-        last = last.unsqueeze(2)
-        output = output[:, :, :-1]
-
         # Replace probability for first value with 0's because we don't know
-        first = last * 0.0
-        output = torch.cat((first, output), dim=2)
+        # (one shifted copy, no zero column or cat)
+        output = F.pad(output[:, :, :-1], (1, 0))
 
         # debug.plot_tensor(output, "test/" + self.name + "/final_out")
         
         return output
 
 
-    def infer_step(self, cond_input, forward_input):
+    def __getstate__(self):
+        # compiled forwards don't pickle, they're rebuilt on first call
+        state = self.__dict__.copy()
+        state["_compiled_forward"] = {}
+        state["_scripted"] = {}
+        return state
+
+    def __setstate__(self, state):
+        # Models pickled before these attributes existed load with their defaults
+        super(Wavenet, self).__setstate__(state)
+        if "res_block_gain" in self.__dict__:
+            # was a plain float attribute
+            gain = self.__dict__.pop("res_block_gain")
+            self.register_buffer("res_block_gain", torch.tensor(float(gain)),
+                                 persistent=False)
+        defaults = {"fast_act": False, "compile_forward": False, "_compiled_forward": {},
+                    "_scripted": {},
+                    "infer_dtype": torch.float32}
+        for name, value in defaults.items():
+            if not hasattr(self, name):
+                setattr(self, name, value)
+
+    
+    @torch.jit.export
+    def infer_step(self, cond_input: Optional[Tensor], forward_input: Tensor) -> Tensor:
         """
-        cond_input: B x n_layer x C
-        forward_input: T ints
+        cond_input: n_layers x B x 2R (B x 2R if same_cond_each_resblock)
+        forward_input: B ints
         """
 
         # Add singleton time dimension
         # FLAG when I add batching, check size before adding batch dim
         forward_input = forward_input.unsqueeze(-1)
-        forward_input = self.in_layer(forward_input)
+        # no-op unless prepare_for_inference set a lower precision
+        forward_input = self.in_layer(forward_input).to(self.infer_dtype)
 
+        cond_list: List[Tensor] = []
         if self.use_conditioning:
+            assert(cond_input is not None)
             cond_input = cond_input.unsqueeze(-1)
+            if not self.same_cond_each_resblock:
+                # one B x 2R x 1 view per layer
+                cond_list = cond_input.unbind(0)
+
+        output: Optional[Tensor] = None
         
         # Residual block loop
-        for i in range(self.n_layers):
+        # (skip and res layers typed as InferStep, so TorchScript can index them by i)
+        for i, dilate_layer in enumerate(self.dilate_layers):
 
-            in_act = self.dilate_layers[i].infer_step(forward_input)
+            in_act = dilate_layer.infer_step(forward_input)
 
             if self.use_conditioning:
-                if self.use_cond_conv:
-                    cond_act = cond_input[:, i, :, :]
-                else:
+                assert(cond_input is not None)
+                if self.same_cond_each_resblock:
                     cond_act = cond_input
+                else:
+                    cond_act = cond_list[i]
                 in_act = in_act + cond_act
                 
-            t_act = F.tanh(in_act[:, :self.n_residual_channels, :])
-            s_act = F.sigmoid(in_act[:, self.n_residual_channels:, :])
-            acts = t_act * s_act
+            if self.fast_act:
+                acts = fast_gated_act(in_act, self.n_residual_channels)
+            else:
+                acts = fused_gated_act(in_act, self.n_residual_channels)
 
             if self.use_skip_out:
-                if i == 0:
-                    output = self.skip_layers[i](acts)
+                skip_layer: InferStep = self.skip_layers[i]
+                if output is None:
+                    output = skip_layer.infer_step(acts)
                 else:
-                    output = self.skip_layers[i](acts) + output
+                    output = skip_layer.infer_step(acts) + output
 
-            if (self.use_res_out_conv) and (i < len(self.res_layers)):
-                acts = self.res_layers[i](acts)
+            # last one is not necessary
+            if (self.use_res_out_conv) and (i < self.n_layers - 1):
+                res_layer: InferStep = self.res_layers[i]
+                acts = res_layer.infer_step(acts)
 
-            forward_input = acts + forward_input
-            forward_input = forward_input * self.res_block_gain
+            forward_input = res_update(acts, forward_input, self.res_block_gain)
             
         if self.use_skip_out:
+            assert(output is not None)
             output = torch.nn.functional.relu(output, True)
-            output = self.conv_out(output)
+            output = self.conv_out.infer_step(output)
             output = torch.nn.functional.relu(output, True)
-            output = self.conv_end(output).squeeze()
+            output = self.conv_end.infer_step(output)
         else:
             output = forward_input
+
+        # drop singleton time dimension: B x C
+        output = output.squeeze(-1)
             
         return output
 
     
+    # no_grad rather than inference_mode: the input memory and weight caches
+    # outlive the call and must stay ordinary tensors (in place updates, DDP syncs)
+    @torch.no_grad()
     def inference(self, cond_features, use_logistic_mix = False,
                   teacher_audio=None, mu_quantization=256,
                   randomize_input=False, rand_sample_chance=0.,
                   length=0, audio_hz=16000, batch_size=0,
-                  cond_channels=0, device="cuda"): 
+                  cond_channels=0, device="cuda", use_cuda_graph=True,
+                  gen_batched=False, target=16000, overlap=800, use_fp16=False,
+                  use_script=False): 
         """
         Generates audio samples equivalent to the length of upsampled cond features
         - Will use teacher audio as forward input, if provided
@@ -423,9 +667,21 @@ class Wavenet(torch.nn.Module):
               samples when teacher samples exhasted.
         - If cond_features=None, generates unconditional output. Last four params 
               (length, batch_size, cond_channels, device) control unconditional output.
+        - On CUDA, a whole step (cond gather, infer_step and sampling) is captured
+              once as a CUDA graph and replayed every sample unless use_cuda_graph=False.
+        - use_script=True runs infer_step from a TorchScript copy of the model,
+              compiled on first use and reused by later calls.
+        - Per-sample inputs live in buffers allocated once and refilled in place,
+              logits are sampled straight from infer_step's output.
+
+        - gen_batched=True splits conditioned generation into segments of target
+              samples (plus overlap) run as one batch, then cross-fades them back
+              together. Needs a single cond sequence and no teacher audio.
+              Returns the same (1 x length+1) shape as unbatched generation.
+        - use_fp16=True runs infer_step in fp16 from half copies of its weights,
+              the model's parameters stay as they are. Sampling stays in fp32.
         """
 
-        
         if self.use_conditioning:
             assert((cond_features is not None) or (length > 0))
             
@@ -443,65 +699,144 @@ class Wavenet(torch.nn.Module):
 
             else:
                 assert(batch_size > 0 and cond_channels > 0)
-                cond_features = torch.zeros(size=[batch_size, cond_channels, length]).to(device)
+                cond_features = torch.zeros(size=[batch_size, cond_channels, length],
+                                            dtype=self.res_block_gain.dtype, device=device)
 
             if self.use_cond_conv:
                 # make condition features for every timestep and res layer
                 cond_features = self.cond_layers(cond_features)
             if not self.same_cond_each_resblock:
                 cond_features = cond_features.view(batch_size, self.n_layers, 2*self.n_residual_channels, length)
+            if use_fp16:
+                cond_features = cond_features.half()
 
         else: # no condtioning
             length = length * audio_hz
+
+        if gen_batched:
+            # WaveRNN style batched generation: segments of one sequence become the batch
+            assert(self.use_conditioning and (teacher_audio is None) and (batch_size == 1))
+            total_length = length
+            # one extra (silent) cond step, so the unfolded audio also covers the
+            # final sample and matches the unbatched length+1 output
+            cond_features = utils.fold_with_overlap(F.pad(cond_features, (0, 1)), target, overlap)
+            batch_size = cond_features.size(0)
+            length = cond_features.size(-1)
         
-        # output buffers
-        logits = torch.zeros(self.n_out_channels, length).to(device)
-        output_audio = torch.zeros(size=[batch_size, length+1]).to(device)
-        output_audio = utils.mu_law_encode(output_audio)
+        # time major output buffer, sample 0 is silence
+        output_audio = utils.mu_law_encode(torch.zeros(length+1, batch_size, device=device))
         
         if teacher_audio is not None:
             teacher_length = teacher_audio.size(1)
         else:
             teacher_length = 0
 
+        # sampling noise is drawn ahead, a block of steps at a time, so each
+        # step samples with a Gumbel-max argmax and no host sync.
+        # Block size comes from a fixed element budget (16 MB of fp32), so large
+        # batches (e.g. gen_batched) draw shorter blocks instead of a B x C x T buffer
         if use_logistic_mix:
-            sampler = SampleDiscretizedMixLogistics()
+            n_gumbel = self.n_out_channels // 3
         else:
-            sampler = utils.CategoricalSampler()
+            n_gumbel = self.n_out_channels
+        noise_budget = 4 * 1024 * 1024
+        noise_steps = max(1, min(length, noise_budget // (batch_size * n_gumbel)))
 
-        #################
-        # inference loop:
-        ##################
-        start_time = time.time()
-        print("Inference progress:")
-        for s in range(length-1):
+        # start every layer's input memory from silence
+        for layer in self.dilate_layers:
+            layer.clear_input_memory()
+        self.prepare_for_inference(torch.float16 if use_fp16 else None)
 
-            # print progress every 100 samples
-            if (s%100 == 0):
-                print(str(s / length), end='\r', flush=True)
+        if self.use_conditioning:
+            # time major, so every step reads one contiguous block:
+            # T x n_layers x B x 2R (T x B x 2R if same_cond_each_resblock)
+            if self.same_cond_each_resblock:
+                cond_features = cond_features.permute(2, 0, 1)
+            else:
+                cond_features = cond_features.permute(3, 1, 0, 2)
+            cond_features = cond_features.contiguous()
+
+        # Per-sample inputs and the step counter live on device and are updated in
+        # place, so one whole step (cond gather, infer_step, sampling) is capturable
+        step_buf = torch.zeros(1, dtype=torch.long, device=device)
+        forward_sample_buf = output_audio[0].clone()
+        gumbel_buf = torch.zeros(noise_steps, batch_size, n_gumbel, device=device)
+        if use_logistic_mix:
+            u_buf = torch.full([noise_steps, batch_size], 0.5, device=device)
+
+        if use_script:
+            step_model = self.script_for_inference()
+        else:
+            step_model = self
 
+        def sample_step():
+            # sample s+1 from cond s and sample s, then feed it back as the next input
             if self.use_conditioning:
-                if self.use_cond_conv:
-                    cond_sample = cond_features[:, :, :, s]
-                else:
-                    cond_sample = cond_features[:, :, s]
+                cond_input = cond_features.index_select(0, step_buf)[0]
             else:
-                cond_sample = None
-                    
-            # flip biased coin to see if raandom sample used
-            if randomize_input and (random.uniform < rand_sample_chance):
-                    forward_sample = torch.randint_like(forward_sample,
-                                                        low=0, high=mu_quantization)
+                cond_input = None
+            logits = step_model.infer_step(cond_input, forward_sample_buf)
+
+            n = step_buf.remainder(noise_steps)
+            if use_logistic_mix:
+                sample = sample_mix_logistics_from_noise(logits, gumbel_buf.index_select(0, n)[0],
+                                                         u_buf.index_select(0, n)[0])
             else:
-                # draw from teacher or previous sample?
-                if (s < teacher_length):
-                    forward_sample = teacher_audio[:, s].clone()
-                else:
-                    forward_sample = output_audio[:, s].clone()
+                sample = torch.argmax(logits + gumbel_buf.index_select(0, n)[0], dim=1)
+
+            output_audio.index_copy_(0, step_buf + 1, sample.unsqueeze(0))
+            forward_sample_buf.copy_(sample)
+            step_buf.add_(1)
+
+        def reset_step():
+            # back to sample 0 and silent input memory
+            step_model.reset_input_memory()
+            step_buf.zero_()
+            output_audio[1:].copy_(output_audio[0])
+            forward_sample_buf.copy_(output_audio[0])
+
+        use_cuda_graph = use_cuda_graph and (torch.device(device).type == "cuda")
+        if use_cuda_graph:
+            graph = self.capture_step(sample_step, reset_step, device)
+            # an empty capture would replay nothing: one test replay must advance a step
+            with torch.cuda.device(device):
+                graph.replay()
+            assert(step_buf.item() == 1), "captured inference step graph is empty"
+            reset_step()
+            # replays run on the model's device, not whichever one is current
+            device_guard = torch.cuda.device(device)
+        else:
+            device_guard = contextlib.nullcontext()
 
-            logits[:, s+1] = self.infer_step(cond_sample, forward_sample)
-            
-            output_audio[:, s+1] = sampler(logits[:, s+1])
+        #################
+        # inference loop:
+        ##################
+        start_time = time.time()
+        print("Inference progress:")
+        with device_guard:
+            for s in range(length-1):
+
+                # print progress every 100 samples
+                if (s%100 == 0):
+                    print(str(s / length), end='\r', flush=True)
+
+                # refill the noise block in place, steps read it by step_buf
+                if s % noise_steps == 0:
+                    utils.gumbel_noise(None, device, out=gumbel_buf)
+                    if use_logistic_mix:
+                        utils.uniform_noise(None, device, out=u_buf)
+
+                # flip biased coin to see if random sample used
+                if randomize_input and (random.random() < rand_sample_chance):
+                    forward_sample_buf.random_(0, mu_quantization)
+                # draw from teacher or previous sample (already in forward_sample_buf)?
+                elif (s < teacher_length):
+                    forward_sample_buf.copy_(teacher_audio[:, s])
+
+                if use_cuda_graph:
+                    graph.replay()
+                else:
+                    sample_step()
 
         end_time = time.time()
         ###################
@@ -510,7 +845,109 @@ class Wavenet(torch.nn.Module):
 
         print("Inference complete in " + str(end_time - start_time))
             
-        return utils.mu_law_decode(output_audio, mu_quantization)
+        audio = utils.mu_law_decode(output_audio.t(), mu_quantization)
+        if gen_batched:
+            audio = utils.xfade_and_unfold(audio[:, :length], target, overlap)
+            audio = audio[:, :total_length+1]
+
+        return audio
+
+    
+    def prepare_for_inference(self, dtype=None):
+        """
+        Snapshots the weights of every layer infer_step uses, cast to dtype.
+        Conv parameters are untouched. Called by inference() after clear_input_memory.
+        dtype: dtype of the infer_step weights and activations, default the parameter dtype
+        """
+        if dtype is None:
+            dtype = self.res_block_gain.dtype
+        self.infer_dtype = dtype
+
+        self.stack_dilate_weights(dtype)
+        for layer in self.res_layers:
+            layer.cache_weights(dtype)
+        if self.use_skip_out:
+            for layer in list(self.skip_layers) + [self.conv_out, self.conv_end]:
+                layer.cache_weights(dtype)
+
+    
+    def stack_dilate_weights(self, dtype=None):
+        """
+        Copies the kernel taps of every dilate layer into one contiguous
+        (n_layers x R x 2R) tensor per tap, plus one (n_layers x 2R) bias.
+        Each layer's infer_step then reads a view of its own slice.
+        Taps are cast to dtype.
+        Call after clear_input_memory, weights are snapshotted here.
+        """
+        if dtype is None:
+            dtype = self.res_block_gain.dtype
+        W0 = torch.stack([layer.conv.weight[:, :, 0].t()
+                          for layer in self.dilate_layers]).to(dtype)
+        W1 = torch.stack([layer.conv.weight[:, :, 1].t()
+                          for layer in self.dilate_layers]).to(dtype)
+        if self.use_dilate_bias:
+            B = torch.stack([layer.conv.bias for layer in self.dilate_layers]).to(dtype)
+
+        for i, layer in enumerate(self.dilate_layers):
+            layer.W0 = W0[i]
+            layer.W1 = W1[i]
+            if self.use_dilate_bias:
+                layer.B = B[i]
+
+    @torch.jit.export
+    def reset_input_memory(self):
+        # Zero every layer's cached inputs in place
+        for layer in self.dilate_layers:
+            layer.reset_input_memory()
+
+    
+    def script_for_inference(self):
+        """
+        Returns the cached TorchScript copy of the model, scripting it on first use.
+        Parameters are shared with the copy, the infer_step caches set by
+        prepare_for_inference (and the input memory) are handed over on every call.
+        """
+        # attribute types are fixed when scripted, so int8 weights need their own copy
+        use_int8 = self.dilate_layers[0].packed_int8 is not None
+        if use_int8 not in self._scripted:
+            self._scripted[use_int8] = torch.jit.script(self)
+        scripted = self._scripted[use_int8]
+
+        scripted_modules = dict(scripted.named_modules())
+        for name, module in self.named_modules():
+            if isinstance(module, Conv):
+                for attr in ("ring", "wp", "W0", "W1", "B", "packed_int8"):
+                    setattr(scripted_modules[name], attr, getattr(module, attr))
+        for attr in ("res_block_gain", "infer_dtype"):
+            setattr(scripted, attr, getattr(self, attr))
+        return scripted
+
+    
+    def capture_step(self, step, reset, device, n_warmup=3):
+        """
+        Captures step() as a CUDA graph: one inference step that reads and updates
+        only static buffers in place. Call graph.replay() once per sample.
+        reset() rewinds whatever step() advances, it runs after the warm up.
+        """
+        # streams are per device: warm up and capture on the model's device,
+        # not whichever one is current
+        with torch.no_grad(), torch.cuda.device(device):
+            # warm up on a side stream, allocates input memory before capture
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                for _ in range(n_warmup):
+                    step()
+            torch.cuda.current_stream().wait_stream(stream)
+
+            # warm up advanced the state, rewind it
+            reset()
+
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph):
+                step()
+
+        return graph
 
     
     def cond_input_for_inference(cond_features, ):
@@ -545,6 +982,29 @@ class Wavenet(torch.nn.Module):
         return cond_features
 
     
+    @torch.no_grad()
+    def export_int8(self):
+        """
+        Quantizes the weights used by infer_step to int8 for CPU inference
+        Training forward and the cond/input layers keep float weights
+        """
+        layers = list(self.dilate_layers) + list(self.res_layers)
+        if self.use_skip_out:
+            layers += list(self.skip_layers) + [self.conv_out, self.conv_end]
+        for layer in layers:
+            layer.export_int8()
+
+    
+    def clear_int8(self):
+        """
+        Drops the int8 weights set by export_int8, they're a snapshot of the
+        float weights at export time. Call before training further or moving to CUDA.
+        """
+        for module in self.modules():
+            if isinstance(module, Conv):
+                module.clear_int8()
+
+    
     def export_weights(self):
         """
         Returns a dictionary with tensors ready for nv_wavenet wrapper
@@ -106,18 +106,21 @@ class L2DiversityLoss(torch.nn.Module):
         loss = torch.sum((k*q_bar - 1) ** 2)
         return loss
     
-def load_checkpoint(checkpoint_path, model, optimizer):
+def load_checkpoint(checkpoint_path, model, optimizer, scaler=None):
     assert os.path.isfile(checkpoint_path)
     checkpoint_dict = torch.load(checkpoint_path, map_location='cpu')
     iteration = checkpoint_dict['iteration']
     optimizer.load_state_dict(checkpoint_dict['optimizer'])
     model_for_loading = checkpoint_dict['model']
     model.load_state_dict(model_for_loading.state_dict())
+    # loss scale of a use_amp run (empty when saved with amp disabled)
+    if (scaler is not None) and checkpoint_dict.get('scaler'):
+        scaler.load_state_dict(checkpoint_dict['scaler'])
     print("Loaded checkpoint '{}' (iteration {})" .format(
           checkpoint_path, iteration))
     return model, optimizer, iteration
 
-def save_checkpoint(model, device, optimizer, learning_rate, iteration, filepath):
+def save_checkpoint(model, device, optimizer, learning_rate, iteration, filepath, scaler=None):
     print("Saving model and optimizer state at iteration {} to {}".format(
           iteration, filepath))
     model_for_saving = Wavenet(**wavenet_config).to(device)
@@ -125,9 +128,11 @@ def save_checkpoint(model, device, optimizer, learning_rate, iteration, filepath
     torch.save({'model': model_for_saving,
                 'iteration': iteration,
                 'optimizer': optimizer.state_dict(),
+                'scaler': scaler.state_dict() if scaler is not None else {},
                 'learning_rate': learning_rate}, filepath)
 
-def save_checkpoint_autoencoder(model, device, use_VAE, optimizer, learning_rate, iteration, filepath):
+def save_checkpoint_autoencoder(model, device, use_VAE, optimizer, learning_rate, iteration, filepath,
+                                scaler=None):
     print("Saving model and optimizer state at iteration {} to {}".format(
           iteration, filepath))
     model_for_saving = WavenetAutoencoder(wavenet_config, cond_wavenet_config, use_VAE).to(device)
@@ -135,6 +140,7 @@ def save_checkpoint_autoencoder(model, device, use_VAE, optimizer, learning_rate
     torch.save({'model': model_for_saving,
                 'iteration': iteration,
                 'optimizer': optimizer.state_dict(),
+                'scaler': scaler.state_dict() if scaler is not None else {},
                 'learning_rate': learning_rate}, filepath)
 
     
@@ -142,7 +148,7 @@ def train(num_gpus, rank, group_name, device, output_directory, epochs, learning
           iters_per_checkpoint, batch_size, seed, checkpoint_path,
           use_scheduled_sampling=False,
           use_wavenet_autoencoder=False, use_variational_autoencoder=False, diversity_scale=0.005,
-          use_logistic_mixtures=False, n_mixtures=3,
+          use_logistic_mixtures=False, n_mixtures=3, use_amp=False,
           audio_hz=16000, midi_hz=250):
 
     if num_gpus > 1:
@@ -172,11 +178,14 @@ def train(num_gpus, rank, group_name, device, output_directory, epochs, learning
         scheduled_sampler = ScheduledSamplerWithPatience(model, sampler, **scheduled_sampler_config)
     
     optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+
+    # mixed precision: fp16 forward under autocast, loss scaling for fp16 gradients
+    scaler = torch.cuda.amp.GradScaler(enabled=use_amp)
     
     # Load checkpoint if one exists
     iteration = 0
     if checkpoint_path != "":
-        model, optimizer, iteration = load_checkpoint(checkpoint_path, model, optimizer)
+        model, optimizer, iteration = load_checkpoint(checkpoint_path, model, optimizer, scaler)
         iteration += 1
 
     # Dataloader
@@ -234,22 +243,24 @@ def train(num_gpus, rank, group_name, device, output_directory, epochs, learning
             if use_scheduled_sampling:
                 y = scheduled_sampler(x, y)                
 
-            y_preds = model((x, y))
+            with torch.cuda.amp.autocast(enabled=use_amp):
+                y_preds = model((x, y))
 
-            if use_wavenet_autoencoder:
-                q_bar = y_preds[1]
-                y_preds = y_preds[0]
+                if use_wavenet_autoencoder:
+                    q_bar = y_preds[1]
+                    y_preds = y_preds[0]
                 
-            loss = criterion(y_preds, y_true)
-            if use_variational_autoencoder:
-                div_loss = diversity_loss(q_bar)
-                loss = loss + (diversity_scale * div_loss)
+                loss = criterion(y_preds, y_true)
+                if use_variational_autoencoder:
+                    div_loss = diversity_loss(q_bar)
+                    loss = loss + (diversity_scale * div_loss)
             if num_gpus > 1:
                 reduced_loss = reduce_tensor(loss.data, num_gpus).item()
             else:
                 reduced_loss = loss.data.item()
-            loss.backward()
-            optimizer.step()
+            scaler.scale(loss).backward()
+            scaler.step(optimizer)
+            scaler.update()
             print("total loss:     {}:\t{:.9f}".format(iteration, reduced_loss))
             if use_variational_autoencoder:
                 print("    diversity loss: {:.9f}".format(div_loss))
@@ -273,10 +284,10 @@ def train(num_gpus, rank, group_name, device, output_directory, epochs, learning
                     checkpoint_path = "{}/wavenet_{}".format(output_directory, iteration)
                     if use_wavenet_autoencoder:
                         save_checkpoint_autoencoder(model, device, use_variational_autoencoder, optimizer, learning_rate,
-                                             iteration, checkpoint_path)
+                                             iteration, checkpoint_path, scaler)
                     else:
                         save_checkpoint(model, device, optimizer, learning_rate, iteration,
-                                        checkpoint_path)
+                                        checkpoint_path, scaler)
 
             iteration += 1            
             del loss
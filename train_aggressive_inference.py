@@ -108,7 +108,7 @@ class L2DiversityLoss(torch.nn.Module):
         loss = torch.sum((k*q_bar - 1) ** 2)
         return loss
     
-def load_checkpoint(checkpoint_path, model, encoder_optimizer, decoder_optimizer):
+def load_checkpoint(checkpoint_path, model, encoder_optimizer, decoder_optimizer, scaler=None):
     assert os.path.isfile(checkpoint_path)
     checkpoint_dict = torch.load(checkpoint_path, map_location='cpu')
     iteration = checkpoint_dict['iteration']
@@ -117,12 +117,16 @@ def load_checkpoint(checkpoint_path, model, encoder_optimizer, decoder_optimizer
     encoder_optimizer.load_state_dict(checkpoint_dict['encoder_optimizer'])    
     model_for_loading = checkpoint_dict['model']
     model.load_state_dict(model_for_loading.state_dict())
+    # loss scale of a use_amp run (empty when saved with amp disabled)
+    if (scaler is not None) and checkpoint_dict.get('scaler'):
+        scaler.load_state_dict(checkpoint_dict['scaler'])
     print("Loaded checkpoint '{}' (iteration {})" .format(
           checkpoint_path, iteration))
     return model, encoder_optimizer, decoder_optimizer, aggressive, iteration
 
 
-def save_checkpoint_autoencoder(model, device, use_VAE, encoder_optimizer, decoder_optimizer, aggressive,  learning_rate, iteration, filepath):
+def save_checkpoint_autoencoder(model, device, use_VAE, encoder_optimizer, decoder_optimizer, aggressive,  learning_rate, iteration, filepath,
+                                scaler=None):
     print("Saving model and optimizer state at iteration {} to {}".format(
           iteration, filepath))
     model_for_saving = WavenetAutoencoder(wavenet_config, cond_wavenet_config, use_VAE).to(device)
@@ -132,6 +136,7 @@ def save_checkpoint_autoencoder(model, device, use_VAE, encoder_optimizer, decod
                 'encoder_optimizer': encoder_optimizer.state_dict(),
                 'decoder_optimizer': decoder_optimizer.state_dict(),
                 'aggressive': aggressive,
+                'scaler': scaler.state_dict() if scaler is not None else {},
                 'learning_rate': learning_rate}, filepath)
 
     
@@ -139,7 +144,7 @@ def train(num_gpus, rank, group_name, device, output_directory, epochs, learning
           iters_per_checkpoint, batch_size, seed, checkpoint_path,
           use_scheduled_sampling=False,
           use_wavenet_autoencoder=True, use_variational_autoencoder=False, diversity_scale=0.005,
-          use_logistic_mixtures=False, n_mixtures=3,
+          use_logistic_mixtures=False, n_mixtures=3, use_amp=False,
           audio_hz=16000, midi_hz=250, aggressive_loss_threshold=3.0, encoder_error_thresh=0.0):
 
     assert use_wavenet_autoencoder is True
@@ -170,6 +175,9 @@ def train(num_gpus, rank, group_name, device, output_directory, epochs, learning
     encoder_optimizer = torch.optim.Adam(model.encoder_wavenet.parameters(), lr=learning_rate)
     decoder_optimizer = torch.optim.Adam(model.wavenet.parameters(), lr=learning_rate)
 
+    # mixed precision: fp16 forward under autocast, loss scaling for fp16 gradients
+    scaler = torch.cuda.amp.GradScaler(enabled=use_amp)
+
     # Train state params
     aggressive = True
     train_encoder = False
@@ -177,7 +185,7 @@ def train(num_gpus, rank, group_name, device, output_directory, epochs, learning
     # Load checkpoint if one exists
     iteration = 0
     if checkpoint_path != "":
-        model, encoder_optimizer, decoder_optimizer, aggressive, iteration = load_checkpoint(checkpoint_path, model, encoder_optimizer, decoder_optimizer)
+        model, encoder_optimizer, decoder_optimizer, aggressive, iteration = load_checkpoint(checkpoint_path, model, encoder_optimizer, decoder_optimizer, scaler)
         iteration += 1
 
     # Dataloader
@@ -234,33 +242,35 @@ def train(num_gpus, rank, group_name, device, output_directory, epochs, learning
             if use_scheduled_sampling:
                 y = scheduled_sampler(x, y)                
 
-            y_preds = model((x, y))
+            with torch.cuda.amp.autocast(enabled=use_amp):
+                y_preds = model((x, y))
             
-            if use_wavenet_autoencoder:
-                q_bar = y_preds[1]
-                y_preds = y_preds[0]
+                if use_wavenet_autoencoder:
+                    q_bar = y_preds[1]
+                    y_preds = y_preds[0]
                 
-            loss = criterion(y_preds, y_true)
-            if use_variational_autoencoder:
-                div_loss = diversity_loss(q_bar)
-                loss = loss + (diversity_scale * div_loss)
+                loss = criterion(y_preds, y_true)
+                if use_variational_autoencoder:
+                    div_loss = diversity_loss(q_bar)
+                    loss = loss + (diversity_scale * div_loss)
             if num_gpus > 1:
                 reduced_loss = reduce_tensor(loss.data, num_gpus).item()
             else:
                 reduced_loss = loss.data.item()
-            loss.backward()
+            scaler.scale(loss).backward()
                 
             if aggressive and train_encoder:
-                encoder_optimizer.step()
+                scaler.step(encoder_optimizer)
                 print("Encoder step")                    
                 
             elif aggressive:
-                decoder_optimizer.step()
+                scaler.step(decoder_optimizer)
                 print("Decoder step")
 
             else: # normal training
-                encoder_optimizer.step()
-                decoder_optimizer.step()
+                scaler.step(encoder_optimizer)
+                scaler.step(decoder_optimizer)
+            scaler.update()
                 
             print("total loss:     {}:\t{:.9f}".format(iteration, reduced_loss))
             if use_variational_autoencoder:
@@ -295,7 +305,7 @@ def train(num_gpus, rank, group_name, device, output_directory, epochs, learning
                     checkpoint_path = "{}/wavenet_{}".format(output_directory, iteration)
                     save_checkpoint_autoencoder(model, device, use_variational_autoencoder,
                                                 encoder_optimizer, decoder_optimizer,
-                                                aggressive, learning_rate, iteration, checkpoint_path)
+                                                aggressive, learning_rate, iteration, checkpoint_path, scaler)
 
             iteration += 1
             del loss
@@ -25,7 +25,9 @@
 # 
 # *****************************************************************************
 import os
+import math
 import torch
+import torch.nn.functional as F
 import numpy as np
 from scipy.io.wavfile import read
 
@@ -84,6 +86,61 @@ def mu_law_encode_numpy(x, mu_quantization=256):
     encoding = ((x_mu + 1) / 2 * mu + 0.5).astype("int64")
     return encoding
 
+def fold_with_overlap(x, target, overlap):
+    """
+    Folds a (1 x ... x T) tensor into (K x ... x (target+overlap)) segments
+    Segment k covers [k*target, k*target + target + overlap), so neighbours
+    share overlap samples. x is zero padded at the end to fit K segments.
+    """
+    assert(x.size(0) == 1)
+    length = x.size(-1)
+    n_folds = max(1, math.ceil((length - overlap) / target))
+    pad = n_folds * target + overlap - length
+    if pad > 0:
+        x = F.pad(x, (0, pad))
+    folded = x.unfold(-1, target + overlap, target)
+    return folded.movedim(-2, 0).squeeze(1).contiguous()
+
+def xfade_and_unfold(y, target, overlap):
+    """
+    Inverse of fold_with_overlap for (K x (target+overlap)) audio segments
+    Overlaps are cross-faded with a raised cosine, returns (1 x (K*target + overlap))
+    """
+    n_folds, seg_length = y.size()
+    assert(seg_length == target + overlap)
+
+    # fade_in + fade_out == 1 over the overlap
+    t = torch.linspace(0, 1, overlap, device=y.device)
+    fade_in = 0.5 - 0.5 * torch.cos(math.pi * t)
+    fade_out = 1 - fade_in
+    window = torch.ones(n_folds, seg_length, device=y.device)
+    window[1:, :overlap] = fade_in
+    window[:-1, target:] = fade_out
+    y = y * window
+
+    unfolded = torch.zeros(n_folds * target + overlap, device=y.device)
+    for k in range(n_folds):
+        unfolded[k*target : k*target + seg_length] += y[k]
+    return unfolded.unsqueeze(0)
+
+def uniform_noise(size, device, floor=1e-5, out=None):
+    """
+    Uniform noise in (floor, 1-floor), drawn directly on device
+    Fills out in place if given (size and device then unused)
+    """
+    if out is None:
+        out = torch.empty(size, device=device)
+    return out.uniform_(floor, 1 - floor)
+
+def gumbel_noise(size, device, floor=1e-5, out=None):
+    """
+    Gumbel noise drawn directly on device
+    argmax(logits + gumbel_noise) is a sample from softmax(logits)
+    Fills out in place if given (size and device then unused)
+    """
+    # in place, no temporaries the size of the block
+    return uniform_noise(size, device, floor, out).log_().neg_().log_().neg_()
+
 def gumbel_noise_like(X, floor=1e-5):
     u = torch.zeros(X.size()).uniform_(1e-5, (1 - 1e-5)).to(X.device)
     return -torch.log(-torch.log(u))